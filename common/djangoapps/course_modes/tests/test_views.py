@@ -24,6 +24,7 @@ from openedx.core.djangoapps.catalog.tests.mixins import CatalogIntegrationMixin
 from openedx.core.djangoapps.embargo.test_utils import restrict_course
 from openedx.core.djangoapps.theming.tests.test_util import with_comprehensive_theme
 from openedx.core.djangoapps.waffle_utils.testutils import override_waffle_flag
+from openedx.features.discounts.applicability import DISCOUNT_APPLICABILITY_FLAG
 from student.models import CourseEnrollment
 from student.tests.factories import CourseEnrollmentFactory, UserFactory
 from util.testing import UrlResetMixin
@@ -398,6 +399,7 @@ class CourseModeViewTest(CatalogIntegrationMixin, UrlResetMixin, ModuleStoreTest
 
         self.assertEquals(course_mode, expected_mode)
 
+    @override_waffle_flag(DISCOUNT_APPLICABILITY_FLAG, active=True)
     @patch('openedx.features.course_experience.utils.can_receive_discount')
     @patch('openedx.features.course_experience.utils.discount_percentage')
     def test_discount_on_track_selection(self, discount_percentage_mock, can_receive_discount_mock):
@@ -11,7 +11,7 @@ import six
 from edx_django_utils.cache import DEFAULT_REQUEST_CACHE
 from opaque_keys.edx.keys import CourseKey
 
-from lms.djangoapps.teams.models import CourseTeam
+from lms.djangoapps.teams.models import CourseTeam, CourseTeamMembership
 from openedx.core.djangoapps.django_comment_common.comment_client import Thread
 from openedx.core.djangoapps.django_comment_common.models import (
     CourseDiscussionSettings,
@@ -113,7 +113,8 @@ def _check_condition(user, condition, content):
             if team is None:
                 passes_condition = True
             else:
-                passes_condition = team.users.filter(id=user.id).exists()
+                # Query the membership table directly, rather than joining through to auth_user via team.users
+                passes_condition = CourseTeamMembership.objects.filter(team_id=team.id, user_id=user.id).exists()
             request_cache_dict[cache_key] = passes_condition
         except KeyError:
             # We do not expect KeyError in production-- it usually indicates an improper test mock.
@@ -21,10 +21,11 @@ from course_modes.tests.factories import CourseModeFactory
 from lms.djangoapps.courseware.tabs import get_course_tab_list
 from lms.djangoapps.courseware.tests.factories import InstructorFactory
 from lms.djangoapps.discussion.django_comment_client.constants import TYPE_ENTRY, TYPE_SUBCATEGORY
+from lms.djangoapps.discussion.django_comment_client.permissions import _check_condition, get_team
 from lms.djangoapps.discussion.django_comment_client.tests.factories import RoleFactory
 from lms.djangoapps.discussion.django_comment_client.tests.unicode import UnicodeTestMixin
 from lms.djangoapps.discussion.django_comment_client.tests.utils import config_course_discussions, topic_name_to_id
-from lms.djangoapps.teams.tests.factories import CourseTeamFactory
+from lms.djangoapps.teams.tests.factories import CourseTeamFactory, CourseTeamMembershipFactory
 from openedx.core.djangoapps.course_groups import cohorts
 from openedx.core.djangoapps.course_groups.cohorts import set_course_cohorted
 from openedx.core.djangoapps.course_groups.tests.helpers import CohortFactory, config_course_cohorts
@@ -1677,6 +1678,25 @@ class PermissionsTestCase(ModuleStoreTestCase):
         del content['user_id']
         self.assertFalse(utils.is_content_authored_by(content, user))
 
+    def test_team_member_condition_queries(self):
+        """
+        Tests that team membership is checked with a single query on the membership table.
+        """
+        RequestCache.clear_all_namespaces()
+        team = CourseTeamFactory(course_id=CourseFactory.create().id)
+        team_member = UserFactory()
+        non_team_member = UserFactory()
+        CourseTeamMembershipFactory(team=team, user=team_member)
+        content = {'commentable_id': team.discussion_topic_id}
+
+        # Load the team into the request cache, so that only the membership check is counted
+        get_team(team.discussion_topic_id)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(_check_condition(team_member, 'is_team_member_if_applicable', content))
+        with self.assertNumQueries(1):
+            self.assertFalse(_check_condition(non_team_member, 'is_team_member_if_applicable', content))
+
 
 class GroupModeratorPermissionsTestCase(ModuleStoreTestCase):
     """Test utils functionality related to forums "abilities" (permissions) for group moderators"""
@@ -6,14 +6,30 @@ from __future__ import absolute_import
 from decimal import Decimal
 from unittest import TestCase
 
+import mock
+import six
+from django.core.cache import cache
+from edx_django_utils.cache import RequestCache
 from opaque_keys.edx.keys import CourseKey
 
+from course_modes.models import CourseMode
 from lms.djangoapps.experiments.utils import (
+    DASHBOARD_INFO_FLAG,
+    PROGRAM_INFO_FLAG,
+    classify_program_enrollment,
     get_course_entitlement_price_and_sku,
+    get_course_partitions,
+    get_dashboard_course_info,
+    get_enrollment_course_ids,
     get_program_price_and_skus,
-    get_unenrolled_courses,
     is_enrolled_in_course_run
 )
+from openedx.core.djangoapps.catalog.cache import COURSE_PROGRAMS_CACHE_KEY_TPL, PROGRAM_CACHE_KEY_TPL
+from openedx.core.djangoapps.catalog.tests.factories import CourseFactory, CourseRunFactory, ProgramFactory
+from openedx.core.djangoapps.waffle_utils.testutils import override_waffle_flag
+from openedx.core.djangolib.testing.utils import CacheIsolationTestCase
+from student.models import CourseEnrollment
+from student.tests.factories import CourseEnrollmentFactory, UserFactory
 
 
 class ExperimentUtilsTests(TestCase):
@@ -40,14 +56,14 @@ class ExperimentUtilsTests(TestCase):
         course_run = {
             'key': 'course-v1:DelftX+NGIx+RA0',
         }
-        enrollment_ids = {CourseKey.from_string('course-v1:DelftX+NGIx+RA0')}
+        enrollment_ids = {'course-v1:DelftX+NGIx+RA0'}
         self.assertTrue(is_enrolled_in_course_run(course_run, enrollment_ids))
 
     def test_invalid_course_run_key_enrollment(self):
         course_run = {
             'key': 'cr_key',
         }
-        enrollment_ids = {CourseKey.from_string('course-v1:DelftX+NGIx+RA0')}
+        enrollment_ids = {'course-v1:DelftX+NGIx+RA0'}
         self.assertFalse(is_enrolled_in_course_run(course_run, enrollment_ids))
 
     def test_program_price_and_skus_for_empty_courses(self):
@@ -56,18 +72,63 @@ class ExperimentUtilsTests(TestCase):
         self.assertEqual(None, skus)
 
     def test_unenrolled_courses_for_empty_courses(self):
-        unenrolled_courses = get_unenrolled_courses([], [])
+        complete_enrollment, unenrolled_courses = classify_program_enrollment([], set(), set())
+        self.assertTrue(complete_enrollment)
         self.assertEqual([], unenrolled_courses)
 
     def test_unenrolled_courses_for_single_course(self):
         course = {'key': 'UQx+ENGY1x'}
         courses_in_program = [course]
-        user_enrollments = []
 
-        unenrolled_courses = get_unenrolled_courses(courses_in_program, user_enrollments)
+        complete_enrollment, unenrolled_courses = classify_program_enrollment(courses_in_program, set(), set())
         expected_unenrolled_courses = [course]
+        self.assertFalse(complete_enrollment)
         self.assertEqual(expected_unenrolled_courses, unenrolled_courses)
 
+    def test_enrollment_course_ids(self):
+        user_enrollments = [
+            mock.Mock(course_id='course-v1:UQx+ENGY1x+3T2017', mode='audit'),
+            mock.Mock(course_id='course-v1:UQx+ENGYCAPx+1T2018', mode='verified'),
+        ]
+
+        enrollment_ids, non_audit_enrollment_ids = get_enrollment_course_ids(user_enrollments)
+        self.assertEqual({'course-v1:UQx+ENGY1x+3T2017', 'course-v1:UQx+ENGYCAPx+1T2018'}, enrollment_ids)
+        self.assertEqual({'course-v1:UQx+ENGYCAPx+1T2018'}, non_audit_enrollment_ids)
+
+    @mock.patch('lms.djangoapps.experiments.utils.get_all_partitions_for_course')
+    def test_course_partitions_cached_by_course_id(self, mock_get_all_partitions_for_course):
+        RequestCache.clear_all_namespaces()
+        course_key = CourseKey.from_string('course-v1:UQx+ENGY1x+3T2017')
+        partitions = [mock.Mock()]
+        mock_get_all_partitions_for_course.return_value = partitions
+
+        # Separately loaded copies of the same course share a cache entry
+        self.assertEqual(partitions, get_course_partitions(mock.Mock(id=course_key)))
+        self.assertEqual(partitions, get_course_partitions(mock.Mock(id=course_key)))
+        self.assertEqual(1, mock_get_all_partitions_for_course.call_count)
+
+        get_course_partitions(mock.Mock(id=CourseKey.from_string('course-v1:UQx+ENGYCAPx+1T2018')))
+        self.assertEqual(2, mock_get_all_partitions_for_course.call_count)
+
+    def test_classify_program_enrollment(self):
+        audit_course = {'key': 'UQx+ENGY1x', 'course_runs': [{'key': 'course-v1:UQx+ENGY1x+3T2017'}]}
+        verified_course = {'key': 'UQx+ENGYCAPx', 'course_runs': [{'key': 'course-v1:UQx+ENGYCAPx+1T2018'}]}
+        unenrolled_course = {'key': 'DelftX+NGIx', 'course_runs': [{'key': 'course-v1:DelftX+NGIx+RA0'}]}
+        enrollment_ids = {'course-v1:UQx+ENGY1x+3T2017', 'course-v1:UQx+ENGYCAPx+1T2018'}
+        non_audit_enrollment_ids = {'course-v1:UQx+ENGYCAPx+1T2018'}
+
+        complete_enrollment, unenrolled_courses = classify_program_enrollment(
+            [audit_course, verified_course], enrollment_ids, non_audit_enrollment_ids
+        )
+        self.assertTrue(complete_enrollment)
+        self.assertEqual([audit_course], unenrolled_courses)
+
+        complete_enrollment, unenrolled_courses = classify_program_enrollment(
+            [audit_course, verified_course, unenrolled_course], enrollment_ids, non_audit_enrollment_ids
+        )
+        self.assertFalse(complete_enrollment)
+        self.assertEqual([audit_course, unenrolled_course], unenrolled_courses)
+
     def test_price_and_sku_from_empty_course(self):
         course = {}
 
@@ -116,3 +177,66 @@ class ExperimentUtilsTests(TestCase):
         self.assertEqual(2, len(skus))
         self.assertIn(self.run_a_sku, skus)
         self.assertIn(self.entitlement_a_sku, skus)
+
+
+class DashboardCourseInfoTests(CacheIsolationTestCase):
+    """
+    Tests of the experiment info for the courses on the dashboard
+    """
+    ENABLED_CACHES = ['default']
+
+    def setUp(self):
+        super(DashboardCourseInfoTests, self).setUp()
+        self.user = UserFactory()
+        self.program_enrollment = CourseEnrollmentFactory(user=self.user, mode=CourseMode.AUDIT)
+        self.other_enrollment = CourseEnrollmentFactory(user=self.user, mode=CourseMode.VERIFIED)
+
+        program_course_run_key = six.text_type(self.program_enrollment.course_id)
+        self.program = ProgramFactory(
+            courses=[CourseFactory(course_runs=[CourseRunFactory(key=program_course_run_key)])],
+            is_program_eligible_for_one_click_purchase=False,
+        )
+        cache.set(
+            COURSE_PROGRAMS_CACHE_KEY_TPL.format(course_run_id=program_course_run_key),
+            [self.program['uuid']],
+            None
+        )
+        cache.set(PROGRAM_CACHE_KEY_TPL.format(uuid=self.program['uuid']), self.program, None)
+
+    @override_waffle_flag(DASHBOARD_INFO_FLAG, active=True)
+    @override_waffle_flag(PROGRAM_INFO_FLAG, active=True)
+    def test_dashboard_course_info(self):
+        dashboard_enrollments = list(CourseEnrollment.enrollments_for_user_with_overviews_preload(self.user))
+        with mock.patch.object(cache, 'get', wraps=cache.get) as mock_get:
+            with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as mock_get_many:
+                course_info = get_dashboard_course_info(self.user, dashboard_enrollments)
+
+        program_course_id = six.text_type(self.program_enrollment.course_id)
+        other_course_id = six.text_type(self.other_enrollment.course_id)
+        self.assertEqual({program_course_id, other_course_id}, set(course_info))
+
+        program_key = course_info[program_course_id]['program_key_fields']
+        self.assertEqual(self.program['uuid'], program_key['uuid'])
+        self.assertEqual(1, program_key['total_courses'])
+        self.assertTrue(program_key['complete_enrollment'])
+        self.assertTrue(program_key['has_courses_left_to_purchase'])
+        self.assertIsNone(course_info[other_course_id]['program_key_fields'])
+
+        # The programs of all of the dashboard courses are read from the cache at once, not once per course
+        course_programs_key_prefix = COURSE_PROGRAMS_CACHE_KEY_TPL.format(course_run_id='')
+        course_programs_gets = [
+            call for call in mock_get.call_args_list if call[0] and call[0][0].startswith(course_programs_key_prefix)
+        ]
+        course_programs_get_manys = [
+            call for call in mock_get_many.call_args_list
+            if call[0] and any(key.startswith(course_programs_key_prefix) for key in call[0][0])
+        ]
+        self.assertEqual([], course_programs_gets)
+        self.assertEqual(1, len(course_programs_get_manys))
+        self.assertEqual(
+            {
+                COURSE_PROGRAMS_CACHE_KEY_TPL.format(course_run_id=program_course_id),
+                COURSE_PROGRAMS_CACHE_KEY_TPL.format(course_run_id=other_course_id),
+            },
+            set(course_programs_get_manys[0][0][0])
+        )
@@ -8,6 +8,7 @@ import logging
 from decimal import Decimal
 
 import six
+from django.db.models import Exists, OuterRef, prefetch_related_objects
 from django.utils.timezone import now
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
@@ -17,9 +18,10 @@ from lms.djangoapps.courseware.access import has_staff_access_to_preview_mode
 from lms.djangoapps.courseware.date_summary import verified_upgrade_deadline_link, verified_upgrade_link_is_valid
 from entitlements.models import CourseEntitlement
 from lms.djangoapps.commerce.utils import EcommerceService
-from openedx.core.djangoapps.catalog.utils import get_programs
+from openedx.core.djangoapps.catalog.utils import get_programs, get_programs_bulk
 from openedx.core.djangoapps.django_comment_common.models import Role
 from openedx.core.djangoapps.waffle_utils import WaffleFlag, WaffleFlagNamespace
+from openedx.core.lib.cache_utils import map_arg_to_id, request_cached
 from openedx.features.course_duration_limits.access import get_user_course_expiration_date
 from openedx.features.course_duration_limits.models import CourseDurationLimitConfig
 from student.models import CourseEnrollment
@@ -129,23 +131,18 @@ def get_program_price_and_skus(courses):
     """
     Get the total program price and purchase skus from these courses in the program
     """
-    program_price = 0
-    skus = []
-
-    for course in courses:
-        course_price, course_sku = get_course_entitlement_price_and_sku(course)
-        if course_price is not None and course_sku is not None:
-            program_price = Decimal(program_price) + Decimal(course_price)
-            skus.append(course_sku)
+    prices_and_skus = [
+        (course_price, course_sku)
+        for course_price, course_sku in (get_course_entitlement_price_and_sku(course) for course in courses)
+        if course_price is not None and course_sku is not None
+    ]
+    program_price = sum((Decimal(course_price) for course_price, __ in prices_and_skus), Decimal(0))
 
     if program_price <= 0:
-        program_price = None
-        skus = None
-    else:
-        program_price = format_course_price(program_price)
-        program_price = six.text_type(program_price)
+        return None, None
 
-    return program_price, skus
+    skus = [course_sku for __, course_sku in prices_and_skus]
+    return format_course_price(program_price), skus
 
 
 def get_course_entitlement_price_and_sku(course):
@@ -171,41 +168,29 @@ def get_course_entitlement_price_and_sku(course):
     return None, None
 
 
-def get_unenrolled_courses(courses, user_enrollments):
+def classify_program_enrollment(courses, enrollment_course_ids, non_audit_enrollment_course_ids):
     """
-    Given a list of courses and a list of user enrollments, return the courses in which the user is not enrolled.
-    Depending on the enrollments that are passed in, this method can be used to determine the courses in a program in
-    which the user has not yet enrolled or the courses in a program for which the user has not yet purchased a
-    certificate.
+    Given the courses in a program and sets of the string form of the course ids of the user's enrollments and
+    non-audit enrollments, return a tuple of whether the user is enrolled in all of the courses and the list of
+    courses in which the user does not have a non-audit enrollment, in a single pass over the courses.
     """
-    # Get the enrollment course ids here, so we don't need to loop through them for every course run
-    enrollment_course_ids = {enrollment.course_id for enrollment in user_enrollments}
+    is_enrolled_in_all = True
     unenrolled_courses = []
 
     for course in courses:
-        if not is_enrolled_in_course(course, enrollment_course_ids):
+        # Non-audit enrollments are a subset of all enrollments, so only check all enrollments if this misses
+        if not is_enrolled_in_course(course, non_audit_enrollment_course_ids):
             unenrolled_courses.append(course)
-    return unenrolled_courses
-
-
-def is_enrolled_in_all_courses(courses, user_enrollments):
-    """
-    Determine if the user is enrolled in all of the courses
-    """
-    # Get the enrollment course ids here, so we don't need to loop through them for every course run
-    enrollment_course_ids = {enrollment.course_id for enrollment in user_enrollments}
-
-    for course in courses:
-        if not is_enrolled_in_course(course, enrollment_course_ids):
-            # User is not enrolled in this course, meaning they are not enrolled in all courses in the program
-            return False
-    # User is enrolled in all courses in the program
-    return True
+            if is_enrolled_in_all and not is_enrolled_in_course(course, enrollment_course_ids):
+                is_enrolled_in_all = False
+    return is_enrolled_in_all, unenrolled_courses
 
 
 def is_enrolled_in_course(course, enrollment_course_ids):
     """
     Determine if the user is enrolled in this course
+
+    ``enrollment_course_ids`` is a set of the string form of the user's enrolled course ids.
     """
     course_runs = course.get('course_runs')
     if course_runs:
@@ -218,33 +203,76 @@ def is_enrolled_in_course(course, enrollment_course_ids):
 def is_enrolled_in_course_run(course_run, enrollment_course_ids):
     """
     Determine if the user is enrolled in this course run
+
+    ``enrollment_course_ids`` is a set of the string form of the user's enrolled course ids.
     """
-    key = None
+    key = course_run.get('key')
+    # Catalog run keys are normally already in canonical form, so check for them directly before paying for a parse
+    if key in enrollment_course_ids:
+        return True
+
     try:
-        key = course_run.get('key')
         course_run_key = CourseKey.from_string(key)
-        return course_run_key in enrollment_course_ids
     except InvalidKeyError:
         logger.warn(
             u'Unable to determine if user was enrolled since the course key {} is invalid'.format(key)
         )
         return False  # Invalid course run key. Assume user is not enrolled.
+    return six.text_type(course_run_key) in enrollment_course_ids
+
+
+def get_enrollment_course_ids(user_enrollments):
+    """
+    Given an already fetched list of a user's enrollments, return a tuple of sets of the string form of the course
+    ids of all of the enrollments, and of the ones that are not in an upsellable mode.
+    """
+    enrollment_course_ids = set()
+    non_audit_enrollment_course_ids = set()
+    for user_enrollment in user_enrollments:
+        course_id = six.text_type(user_enrollment.course_id)
+        enrollment_course_ids.add(course_id)
+        if user_enrollment.mode not in CourseMode.UPSELL_TO_VERIFIED_MODES:
+            non_audit_enrollment_course_ids.add(course_id)
+    return enrollment_course_ids, non_audit_enrollment_course_ids
 
 
 def get_dashboard_course_info(user, dashboard_enrollments):
     """
     Given a list of enrollments shown on the dashboard, return a dict of course ids and experiment info for that course
+
+    The course of each dashboard enrollment is read from ``course_overview``, so callers should pass enrollments
+    with their CourseOverviews already loaded (e.g. from
+    ``CourseEnrollment.enrollments_for_user_with_overviews_preload``) to avoid a query per enrollment.
     """
     course_info = None
     if DASHBOARD_INFO_FLAG.is_enabled():
         # Get the enrollments here since the dashboard filters out those with completed entitlements
-        user_enrollments = CourseEnrollment.objects.select_related('course').filter(user_id=user.id)
+        user_enrollments = list(CourseEnrollment.objects.select_related('course').filter(user_id=user.id))
+        # Build the course id sets once, rather than once per dashboard course
+        enrollment_course_ids, non_audit_enrollment_course_ids = get_enrollment_course_ids(user_enrollments)
+
+        # Load the schedules for all of the dashboard enrollments in one query, since the upgrade deadline
+        # of each one may depend on its schedule
+        prefetch_related_objects(dashboard_enrollments, 'schedule')
+
+        # Check the flag and look up the programs for all of the dashboard courses at once, rather than once per
+        # course. Courses without an entry here get an empty list, so get_program_context won't look them up again.
+        programs_by_course = {}
+        if PROGRAM_INFO_FLAG.is_enabled():
+            programs_by_course = get_programs_bulk(
+                [dashboard_enrollment.course_id for dashboard_enrollment in dashboard_enrollments]
+            )
 
         course_info = {
-            str(dashboard_enrollment.course): get_base_experiment_metadata_context(dashboard_enrollment.course,
-                                                                                   user,
-                                                                                   dashboard_enrollment,
-                                                                                   user_enrollments)
+            str(dashboard_enrollment.course_id): get_base_experiment_metadata_context(
+                dashboard_enrollment.course_overview,
+                user,
+                dashboard_enrollment,
+                user_enrollments,
+                programs=programs_by_course.get(dashboard_enrollment.course_id, []),
+                enrollment_course_ids=enrollment_course_ids,
+                non_audit_enrollment_course_ids=non_audit_enrollment_course_ids,
+            )
             for dashboard_enrollment in dashboard_enrollments
         }
     return course_info
@@ -255,40 +283,60 @@ def get_experiment_user_metadata_context(course, user):
     """
     Return a context dictionary with the keys used by the user_metadata.html.
     """
+    is_authenticated = bool(user.is_authenticated)
+    user_enrollments = []
     enrollment = None
+    enrollment_course_ids = set()
     # TODO: clean up as part of REVO-28 (START)
-    user_enrollments = None
-    audit_enrollments = None
-    has_non_audit_enrollments = False
-    try:
-        user_enrollments = CourseEnrollment.objects.select_related('course').filter(user_id=user.id)
-        has_non_audit_enrollments = user_enrollments.exclude(mode__in=CourseMode.UPSELL_TO_VERIFIED_MODES).exists()
-        # TODO: clean up as part of REVO-28 (END)
-        enrollment = CourseEnrollment.objects.select_related(
-            'course'
-        ).get(user_id=user.id, course_id=course.id)
-    except CourseEnrollment.DoesNotExist:
-        pass  # Not enrolled, use the default values
-
+    non_audit_enrollment_course_ids = set()
     has_entitlements = False
-    if user.is_authenticated():
-        has_entitlements = CourseEntitlement.objects.filter(user=user).exists()
-
-    context = get_base_experiment_metadata_context(course, user, enrollment, user_enrollments)
-    has_staff_access = has_staff_access_to_preview_mode(user, course.id)
+    # TODO: clean up as part of REVO-28 (END)
     forum_roles = []
-    if user.is_authenticated:
+    user_partitions = {}
+
+    if is_authenticated:
+        # Fetch the user's enrollments once and derive everything else we need from them in Python. The schedule
+        # is loaded along with them since the upgrade deadline of the current enrollment may depend on it, and
+        # whether the user has any entitlements is checked in the same query.
+        user_enrollments = list(
+            CourseEnrollment.objects.select_related('course', 'schedule').filter(user_id=user.id).annotate(
+                user_has_entitlements=Exists(CourseEntitlement.objects.filter(user_id=OuterRef('user_id')))
+            )
+        )
+        enrollment = next(
+            (user_enrollment for user_enrollment in user_enrollments if user_enrollment.course_id == course.id),
+            None  # Not enrolled, use the default values
+        )
+
+        enrollment_course_ids, non_audit_enrollment_course_ids = get_enrollment_course_ids(user_enrollments)
+
+        # TODO: clean up as part of REVO-28 (START)
+        if not non_audit_enrollment_course_ids:
+            # Entitlements only matter if the user has no non-audit enrollments
+            if user_enrollments:
+                has_entitlements = user_enrollments[0].user_has_entitlements
+            else:
+                has_entitlements = CourseEntitlement.objects.filter(user=user).exists()
+        # TODO: clean up as part of REVO-28 (END)
+
         forum_roles = list(Role.objects.filter(users=user, course_id=course.id).values_list('name').distinct())
 
-    # get user partition data
-    if user.is_authenticated():
-        partition_groups = get_all_partitions_for_course(course)
+        # get user partition data
+        partition_groups = get_course_partitions(course)
         user_partitions = get_user_partition_groups(course.id, partition_groups, user, 'name')
-    else:
-        user_partitions = {}
+
+    context = get_base_experiment_metadata_context(
+        course,
+        user,
+        enrollment,
+        user_enrollments,
+        enrollment_course_ids=enrollment_course_ids,
+        non_audit_enrollment_course_ids=non_audit_enrollment_course_ids,
+    )
+    has_staff_access = has_staff_access_to_preview_mode(user, course.id)
 
     # TODO: clean up as part of REVO-28 (START)
-    context['has_non_audit_enrollments'] = has_non_audit_enrollments or has_entitlements
+    context['has_non_audit_enrollments'] = bool(non_audit_enrollment_course_ids) or has_entitlements
     # TODO: clean up as part of REVO-28 (END)
     context['has_staff_access'] = has_staff_access
     context['forum_roles'] = forum_roles
@@ -296,14 +344,35 @@ def get_experiment_user_metadata_context(course, user):
     return context
 
 
-def get_base_experiment_metadata_context(course, user, enrollment, user_enrollments):
+@request_cached(arg_map_function=map_arg_to_id)
+def get_course_partitions(course):
+    """
+    Return all of the user partitions for this course, cached for the request by course id.
+
+    get_all_partitions_for_course is itself request cached, but keyed on the course object, so separately loaded
+    copies of the same course would each walk its partitions again.
+    """
+    return get_all_partitions_for_course(course)
+
+
+def get_base_experiment_metadata_context(course, user, enrollment, user_enrollments, programs=None,
+                                         enrollment_course_ids=None, non_audit_enrollment_course_ids=None):
     """
     Return a context dictionary with the keys used by dashboard_metadata.html and user_metadata.html
+
+    ``programs`` and the enrollment course id sets may be passed in by callers that have already built them
+    (see ``get_program_context``).
     """
     enrollment_mode = None
     enrollment_time = None
     # TODO: clean up as part of REVEM-199 (START)
-    program_key = get_program_context(course, user_enrollments)
+    program_key = get_program_context(
+        course,
+        user_enrollments,
+        programs=programs,
+        enrollment_course_ids=enrollment_course_ids,
+        non_audit_enrollment_course_ids=non_audit_enrollment_course_ids,
+    )
     # TODO: clean up as part of REVEM-199 (END)
     if enrollment and enrollment.is_active:
         enrollment_mode = enrollment.mode
@@ -343,55 +412,65 @@ def get_audit_access_expiration(user, course):
 
 
 # TODO: clean up as part of REVEM-199 (START)
-def get_program_context(course, user_enrollments):
+def get_program_context(course, user_enrollments, programs=None, enrollment_course_ids=None,
+                        non_audit_enrollment_course_ids=None):
     """
     Return a context dictionary with program information.
+
+    ``user_enrollments`` is the list of the user's enrollments, shared with the caller rather than re-queried.
+    ``enrollment_course_ids`` and ``non_audit_enrollment_course_ids`` are the sets returned for it by
+    ``get_enrollment_course_ids``; callers building context for many courses should build them once and pass
+    them in. If ``programs`` (the programs containing this course) or the sets are not supplied, they are looked
+    up here. Callers that supply ``programs`` are responsible for checking PROGRAM_INFO_FLAG, so that it is only
+    evaluated once no matter how many courses they're building context for.
     """
     program_key = None
-    non_audit_enrollments = user_enrollments.exclude(mode__in=CourseMode.UPSELL_TO_VERIFIED_MODES)
 
-    if PROGRAM_INFO_FLAG.is_enabled():
+    if programs is None and PROGRAM_INFO_FLAG.is_enabled():
         programs = get_programs(course=course.id)
-        if programs:
-            # A course can be in multiple programs, but we're just grabbing the first one
-            program = programs[0]
-            complete_enrollment = False
-            has_courses_left_to_purchase = False
-            total_courses = None
-            courses = program.get('courses')
-            courses_left_to_purchase_price = None
-            courses_left_to_purchase_url = None
-            program_uuid = program.get('uuid')
-            is_eligible_for_one_click_purchase = program.get('is_program_eligible_for_one_click_purchase')
-            if courses is not None:
-                total_courses = len(courses)
-                complete_enrollment = is_enrolled_in_all_courses(courses, user_enrollments)
-
-                # Get the price and purchase URL of the program courses the user has yet to purchase. Say a
-                # program has 3 courses (A, B and C), and the user previously purchased a certificate for A.
-                # The user is enrolled in audit mode for B. The "left to purchase price" should be the price of
-                # B+C.
-                courses_left_to_purchase = get_unenrolled_courses(courses, non_audit_enrollments)
-                if courses_left_to_purchase:
-                    has_courses_left_to_purchase = True
-                if courses_left_to_purchase and is_eligible_for_one_click_purchase:
-                    courses_left_to_purchase_price, courses_left_to_purchase_skus = \
-                        get_program_price_and_skus(courses_left_to_purchase)
-                    if courses_left_to_purchase_skus:
-                        courses_left_to_purchase_url = EcommerceService().get_checkout_page_url(
-                            *courses_left_to_purchase_skus, program_uuid=program_uuid)
-
-            program_key = {
-                'uuid': program_uuid,
-                'title': program.get('title'),
-                'marketing_url': program.get('marketing_url'),
-                'status': program.get('status'),
-                'is_eligible_for_one_click_purchase': is_eligible_for_one_click_purchase,
-                'total_courses': total_courses,
-                'complete_enrollment': complete_enrollment,
-                'has_courses_left_to_purchase': has_courses_left_to_purchase,
-                'courses_left_to_purchase_price': courses_left_to_purchase_price,
-                'courses_left_to_purchase_url': courses_left_to_purchase_url,
-            }
+    if programs:
+        # A course can be in multiple programs, but we're just grabbing the first one
+        program = programs[0]
+        complete_enrollment = False
+        has_courses_left_to_purchase = False
+        total_courses = None
+        courses = program.get('courses')
+        courses_left_to_purchase_price = None
+        courses_left_to_purchase_url = None
+        program_uuid = program.get('uuid')
+        is_eligible_for_one_click_purchase = program.get('is_program_eligible_for_one_click_purchase')
+        if courses is not None:
+            total_courses = len(courses)
+            if enrollment_course_ids is None or non_audit_enrollment_course_ids is None:
+                enrollment_course_ids, non_audit_enrollment_course_ids = get_enrollment_course_ids(user_enrollments)
+
+            # Get the price and purchase URL of the program courses the user has yet to purchase. Say a
+            # program has 3 courses (A, B and C), and the user previously purchased a certificate for A.
+            # The user is enrolled in audit mode for B. The "left to purchase price" should be the price of
+            # B+C.
+            complete_enrollment, courses_left_to_purchase = classify_program_enrollment(
+                courses, enrollment_course_ids, non_audit_enrollment_course_ids
+            )
+            if courses_left_to_purchase:
+                has_courses_left_to_purchase = True
+            if courses_left_to_purchase and is_eligible_for_one_click_purchase:
+                courses_left_to_purchase_price, courses_left_to_purchase_skus = \
+                    get_program_price_and_skus(courses_left_to_purchase)
+                if courses_left_to_purchase_skus:
+                    courses_left_to_purchase_url = EcommerceService().get_checkout_page_url(
+                        *courses_left_to_purchase_skus, program_uuid=program_uuid)
+
+        program_key = {
+            'uuid': program_uuid,
+            'title': program.get('title'),
+            'marketing_url': program.get('marketing_url'),
+            'status': program.get('status'),
+            'is_eligible_for_one_click_purchase': is_eligible_for_one_click_purchase,
+            'total_courses': total_courses,
+            'complete_enrollment': complete_enrollment,
+            'has_courses_left_to_purchase': has_courses_left_to_purchase,
+            'courses_left_to_purchase_price': courses_left_to_purchase_price,
+            'courses_left_to_purchase_url': courses_left_to_purchase_url,
+        }
     return program_key
 # TODO: clean up as part of REVEM-199 (START)
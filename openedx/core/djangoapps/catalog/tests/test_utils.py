@@ -49,6 +49,7 @@ from openedx.core.djangoapps.catalog.utils import (
     get_pathways,
     get_program_types,
     get_programs,
+    get_programs_bulk,
     get_programs_by_type,
     get_visible_sessions_for_entitlement,
     normalize_program_type,
@@ -215,6 +216,28 @@ class TestGetPrograms(CacheIsolationTestCase):
         self.assertEqual(actual_program, [expected_program])
         self.assertFalse(mock_warning.called)
 
+    def test_get_bulk_from_courses(self, mock_warning, _mock_info):
+        expected_program = ProgramFactory()
+        expected_course = expected_program['courses'][0]['course_runs'][0]['key']
+        other_course = 'course-v1:edX+Other+Run'
+
+        self.assertEqual(get_programs_bulk([expected_course]), {expected_course: []})
+
+        cache.set(
+            COURSE_PROGRAMS_CACHE_KEY_TPL.format(course_run_id=expected_course),
+            [expected_program['uuid']],
+            None
+        )
+        cache.set(
+            PROGRAM_CACHE_KEY_TPL.format(uuid=expected_program['uuid']),
+            expected_program,
+            None
+        )
+
+        actual_programs = get_programs_bulk([expected_course, other_course])
+        self.assertEqual(actual_programs, {expected_course: [expected_program], other_course: []})
+        self.assertFalse(mock_warning.called)
+
     def test_get_via_uuids(self, mock_warning, _mock_info):
         first_program = ProgramFactory()
         second_program = ProgramFactory()
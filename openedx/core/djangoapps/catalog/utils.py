@@ -130,6 +130,44 @@ def get_programs(site=None, uuid=None, uuids=None, course=None, organization=Non
     return get_programs_by_uuids(uuids)
 
 
+def get_programs_bulk(course_ids):
+    """
+    Read the programs containing each of the given course runs from the cache.
+
+    This reads the same cache entries as ``get_programs(course=...)``, but for all of the
+    course runs at once, so that callers looping over many courses only hit the cache once.
+
+    Arguments:
+        course_ids (list of CourseKey or string): course ids identifying the course runs.
+
+    Returns:
+        dict mapping each course id to a list of dicts, representing the programs containing it.
+    """
+    cache_keys = {
+        COURSE_PROGRAMS_CACHE_KEY_TPL.format(course_run_id=course_id): course_id for course_id in course_ids
+    }
+    uuids_by_course_id = {
+        cache_keys[cache_key]: [text_type(program_uuid) for program_uuid in uuids]
+        for cache_key, uuids in cache.get_many(list(cache_keys)).items()
+        if uuids
+    }
+
+    program_uuids = set()
+    for uuids in uuids_by_course_id.values():
+        program_uuids.update(uuids)
+    programs_by_uuid = {}
+    if program_uuids:
+        programs_by_uuid = {program['uuid']: program for program in get_programs_by_uuids(program_uuids)}
+
+    return {
+        course_id: [
+            programs_by_uuid[program_uuid] for program_uuid in uuids_by_course_id.get(course_id, [])
+            if program_uuid in programs_by_uuid
+        ]
+        for course_id in course_ids
+    }
+
+
 def get_programs_by_type(site, program_type):
     """
     Keyword Arguments:
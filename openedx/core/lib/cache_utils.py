@@ -80,6 +80,14 @@ def request_cached(namespace=None, arg_map_function=None, request_cache_getter=N
     return decorator
 
 
+def map_arg_to_id(arg):
+    """
+    An arg_map_function for request_cached that maps objects with an id, like
+    users and courses, to their id, and any other argument to its string form.
+    """
+    return force_text(getattr(arg, 'id', arg))
+
+
 def _func_call_cache_key(func, arg_map_function, *args, **kwargs):
     """
     Returns a cache key based on the function's module,
@@ -9,7 +9,7 @@ import ddt
 from mock import Mock
 
 from edx_django_utils.cache import RequestCache
-from openedx.core.lib.cache_utils import request_cached
+from openedx.core.lib.cache_utils import map_arg_to_id, request_cached
 import six
 
 
@@ -297,3 +297,27 @@ class TestRequestCachedDecorator(TestCase):
         result = wrapped(3)
         self.assertEqual(result, 2)
         self.assertEqual(to_be_wrapped.call_count, 2)
+
+    def test_request_cached_with_map_arg_to_id(self):
+        """
+        Ensure that map_arg_to_id keys the cache on the ids of objects that have one.
+        """
+        to_be_wrapped = Mock()
+        to_be_wrapped.side_effect = [1, 2, 3]
+
+        def mock_wrapper(*args, **kwargs):
+            """Simple wrapper to let us decorate our mock."""
+            return to_be_wrapped(*args, **kwargs)
+
+        wrapped = request_cached(arg_map_function=map_arg_to_id)(mock_wrapper)
+
+        # Different objects with the same id share a cache entry.
+        self.assertEqual(wrapped(Mock(id=1)), 1)
+        self.assertEqual(wrapped(Mock(id=1)), 1)
+        self.assertEqual(to_be_wrapped.call_count, 1)
+
+        # Arguments without an id are keyed on their string form.
+        self.assertEqual(wrapped(Mock(id=2)), 2)
+        self.assertEqual(wrapped(2), 2)
+        self.assertEqual(wrapped(u'other'), 3)
+        self.assertEqual(to_be_wrapped.call_count, 3)
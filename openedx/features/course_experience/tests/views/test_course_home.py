@@ -35,7 +35,7 @@ from lms.djangoapps.courseware.tests.factories import (
     StaffFactory
 )
 from lms.djangoapps.discussion.django_comment_client.tests.factories import RoleFactory
-from openedx.features.discounts.applicability import get_discount_expiration_date
+from openedx.features.discounts.applicability import DISCOUNT_APPLICABILITY_FLAG, get_discount_expiration_date
 from openedx.features.discounts.utils import format_strikeout_price
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from openedx.core.djangoapps.dark_lang.models import DarkLangConfig
@@ -56,6 +56,7 @@ from openedx.features.course_experience import (
     SHOW_UPGRADE_MSG_ON_COURSE_HOME,
     UNIFIED_COURSE_TAB_FLAG
 )
+from openedx.features.course_experience.utils import get_first_purchase_offer_banner_fragment
 from student.models import CourseEnrollment
 from student.tests.factories import UserFactory
 from util.date_utils import strftime_localized
@@ -220,7 +221,7 @@ class TestCourseHomePage(CourseHomePageTestCase):
 
         # Fetch the view and verify the query counts
         # TODO: decrease query count as part of REVO-28
-        with self.assertNumQueries(97, table_blacklist=QUERY_COUNT_TABLE_BLACKLIST):
+        with self.assertNumQueries(93, table_blacklist=QUERY_COUNT_TABLE_BLACKLIST):
             with check_mongo_calls(4):
                 url = course_home_url(self.course)
                 self.client.get(url)
@@ -413,6 +414,7 @@ class TestCourseHomePageAccess(CourseHomePageTestCase):
         )
         self.assertRedirects(response, expected_url)
 
+    @override_waffle_flag(DISCOUNT_APPLICABILITY_FLAG, active=True)
     @mock.patch('openedx.features.course_experience.utils.discount_percentage')
     @mock.patch('openedx.features.course_experience.utils.can_receive_discount')
     @ddt.data(
@@ -453,6 +455,15 @@ class TestCourseHomePageAccess(CourseHomePageTestCase):
         else:
             self.assertNotContains(response, bannerText, html=True)
 
+    @override_waffle_flag(DISCOUNT_APPLICABILITY_FLAG, active=False)
+    def test_first_purchase_offer_banner_no_queries_when_disabled(self):
+        """
+        Ensure the first purchase offer banner makes no queries when discounting is disabled
+        """
+        user = self.create_user_for_course(self.course, CourseUserType.ENROLLED)
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_first_purchase_offer_banner_fragment(user, self.course))
+
     @mock.patch.dict(settings.FEATURES, {'DISABLE_START_DATES': False})
     def test_course_does_not_expire_for_verified_user(self):
         """
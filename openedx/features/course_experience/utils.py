@@ -4,18 +4,17 @@ Common utilities for the course experience, including course outline.
 from __future__ import absolute_import
 
 from completion.models import BlockCompletion
-from django.utils.translation import ugettext as _
+from django.utils.translation import ugettext_lazy as _
 from opaque_keys.edx.keys import CourseKey
-from six.moves import range
 from web_fragments.fragment import Fragment
 
 from lms.djangoapps.course_api.blocks.api import get_blocks
-from lms.djangoapps.course_blocks.utils import get_student_module_as_dict
 from lms.djangoapps.courseware.date_summary import verified_upgrade_deadline_link
 from openedx.core.djangolib.markup import HTML
-from openedx.core.lib.cache_utils import request_cached
+from openedx.core.lib.cache_utils import map_arg_to_id, request_cached
 from openedx.features.discounts.applicability import (
     can_receive_discount,
+    discounts_enabled,
     get_discount_expiration_date,
     discount_percentage
 )
@@ -23,6 +22,30 @@ from openedx.features.discounts.utils import format_strikeout_price
 from xmodule.modulestore.django import modulestore
 
 
+# The first purchase offer banner message, translated into the active language when it is formatted
+# Translator: xgettext:no-python-format
+_OFFER_MESSAGE = _(u'{banner_open} Upgrade by {discount_expiration_date} and save {percentage}% '
+                   u'[{strikeout_price}]{span_close}{br}Discount will be automatically applied at checkout. '
+                   u'{a_open}Upgrade Now{a_close}{div_close}')
+
+
+def _load_course_completions(user, course_key):
+    """
+    Returns a tuple of the user's latest completion in the course (or None), and
+    a dict of the user's course completion values keyed by full block key.
+
+    Both are derived from a single query, rather than one query for each.
+    """
+    completions = list(
+        BlockCompletion.objects.filter(user=user, course_key=course_key).order_by('-modified')
+    )
+    latest_completion = completions[0] if completions else None
+    course_block_completions = {
+        completion.full_block_key: completion.completion for completion in completions
+    }
+    return latest_completion, course_block_completions
+
+
 @request_cached()
 def get_course_outline_block_tree(request, course_id, user=None):
     """
@@ -31,105 +54,64 @@ def get_course_outline_block_tree(request, course_id, user=None):
 
     assert user is None or user.is_authenticated
 
-    def populate_children(block, all_blocks):
-        """
-        Replace each child id with the full block for the child.
-
-        Given a block, replaces each id in its children array with the full
-        representation of that child, which will be looked up by id in the
-        passed all_blocks dict. Recursively do the same replacement for children
-        of those children.
-        """
-        children = block.get('children', [])
-
-        for i in range(len(children)):
-            child_id = block['children'][i]
-            child_detail = populate_children(all_blocks[child_id], all_blocks)
-            block['children'][i] = child_detail
-
-        return block
-
-    def set_last_accessed_default(block):
-        """
-        Set default of False for resume_block on all blocks.
-        """
-        block['resume_block'] = False
-        block['complete'] = False
-        for child in block.get('children', []):
-            set_last_accessed_default(child)
-
-    def mark_blocks_completed(block, user, course_key):
+    def populate_children_and_mark_complete(root_block, all_blocks, course_block_completions=None,
+                                            latest_completion=None):
         """
-        Walk course tree, marking block completion.
-        Mark 'most recent completed block as 'resume_block'
-
-        """
-        last_completed_child_position = BlockCompletion.get_latest_block_completed(user, course_key)
-
-        if last_completed_child_position:
-            # Mutex w/ NOT 'course_block_completions'
-            recurse_mark_complete(
-                course_block_completions=BlockCompletion.get_course_completions(user, course_key),
-                latest_completion=last_completed_child_position,
-                block=block
-            )
-
-    def recurse_mark_complete(course_block_completions, latest_completion, block):
-        """
-        Helper function to walk course tree dict,
-        marking blocks as 'complete' and 'last_complete'
-
-        If all blocks are complete, mark parent block complete
-        mark parent blocks of 'last_complete' as 'last_complete'
-
+        Walk the course tree to:
+
+        * Replace each child id with the full block for the child, which will
+          be looked up by id in the passed all_blocks dict.
+        * If course_block_completions is given, set defaults of False for
+          'resume_block' and 'complete' on every block.
+        * If latest_completion is also given, mark completed blocks as
+          'complete' and the most recently completed block as 'resume_block'.
+          A parent block is 'complete' if all of its children are complete,
+          and is a 'resume_block' if any of its children is.
+
+        The tree is first flattened into a list with each block ahead of its
+        descendants, replacing the child ids on the way. Walking that list in
+        reverse then visits every block after all of its descendants.
+
+        :param root_block: course_outline_root_block block object
+        :param all_blocks: dict[block_id] = block object
         :param course_block_completions: dict[course_completion_object] =  completion_value
         :param latest_completion: course_completion_object
-        :param block: course_outline_root_block block object or child block
-
-        :return:
-            block: course_outline_root_block block object or child block
         """
-        block_key = block.serializer.instance
-
-        if course_block_completions.get(block_key):
-            block['complete'] = True
-            if block_key == latest_completion.full_block_key:
-                block['resume_block'] = True
-
-        if block.get('children'):
-            for idx in range(len(block['children'])):
-                recurse_mark_complete(
-                    course_block_completions,
-                    latest_completion,
-                    block=block['children'][idx]
-                )
-                if block['children'][idx].get('resume_block') is True:
+        blocks = []
+        stack = [root_block]
+        while stack:
+            block = stack.pop()
+            blocks.append(block)
+            children = block.get('children')
+            if children:
+                block['children'] = children = [all_blocks[child_id] for child_id in children]
+                stack.extend(children)
+
+        if course_block_completions is None:
+            return
+
+        # The latest completed block key is the same for every block, so only look it up once
+        latest_block_key = latest_completion.full_block_key if latest_completion else None
+        for block in reversed(blocks):
+            block['resume_block'] = False
+            block['complete'] = False
+            if not latest_completion:
+                continue
+
+            block_key = block.serializer.instance
+            if course_block_completions.get(block_key):
+                block['complete'] = True
+                if block_key == latest_block_key:
                     block['resume_block'] = True
 
-            completable_blocks = [child for child in block['children']
-                                  if child.get('type') != 'discussion']
-            if all(child.get('complete') for child in completable_blocks):
-                block['complete'] = True
+            children = block.get('children')
+            if children:
+                if any(child.get('resume_block') is True for child in children):
+                    block['resume_block'] = True
 
-    def mark_last_accessed(user, course_key, block):
-        """
-        Recursively marks the branch to the last accessed block.
-        """
-        block_key = block.serializer.instance
-        student_module_dict = get_student_module_as_dict(user, course_key, block_key)
-
-        last_accessed_child_position = student_module_dict.get('position')
-        if last_accessed_child_position and block.get('children'):
-            block['resume_block'] = True
-            if last_accessed_child_position <= len(block['children']):
-                last_accessed_child_block = block['children'][last_accessed_child_position - 1]
-                last_accessed_child_block['resume_block'] = True
-                mark_last_accessed(user, course_key, last_accessed_child_block)
-            else:
-                # We should be using an id in place of position for last accessed.
-                # However, while using position, if the child block is no longer accessible
-                # we'll use the last child.
-                block['children'][-1]['resume_block'] = True
+                if all(child.get('complete') for child in children
+                       if child.get('type') != 'discussion'):
+                    block['complete'] = True
 
     course_key = CourseKey.from_string(course_id)
     course_usage_key = modulestore().make_course_usage_key(course_key)
@@ -169,14 +151,17 @@ def get_course_outline_block_tree(request, course_id, user=None):
 
     course_outline_root_block = all_blocks['blocks'].get(all_blocks['root'], None)
     if course_outline_root_block:
-        populate_children(course_outline_root_block, all_blocks['blocks'])
+        course_block_completions = None
+        latest_completion = None
         if user:
-            set_last_accessed_default(course_outline_root_block)
-            mark_blocks_completed(
-                block=course_outline_root_block,
-                user=request.user,
-                course_key=course_key
-            )
+            latest_completion, course_block_completions = _load_course_completions(request.user, course_key)
+
+        populate_children_and_mark_complete(
+            course_outline_root_block,
+            all_blocks['blocks'],
+            course_block_completions=course_block_completions,
+            latest_completion=latest_completion,
+        )
     return course_outline_root_block
 
 
@@ -187,26 +172,35 @@ def get_resume_block(block):
     """
     if block.get('authorization_denial_reason') or not block['resume_block']:
         return None
-    if not block.get('children'):
-        return block
 
-    for child in block['children']:
-        resume_block = get_resume_block(child)
-        if resume_block:
-            return resume_block
+    # Follow the first accessible child marked as 'resume_block' down the tree,
+    # stopping at the deepest one rather than recursing into every branch.
+    while True:
+        resume_child = next(
+            (
+                child for child in block.get('children') or ()
+                if not child.get('authorization_denial_reason') and child['resume_block']
+            ),
+            None
+        )
+        if resume_child is None:
+            break
+        block = resume_child
     return block
 
 
+@request_cached(arg_map_function=map_arg_to_id)
 def get_first_purchase_offer_banner_fragment(user, course):
-    if user and course:
+    """
+    Returns the first purchase offer banner fragment for the user in the course, or None if no offer applies.
+
+    The cheapest checks come first, and the upgrade link and strikeout price are only built once the offer applies.
+    """
+    if user and course and discounts_enabled(user):
         discount_expiration_date = get_discount_expiration_date(user, course)
         if (discount_expiration_date and
                 can_receive_discount(user=user, course=course, discount_expiration_date=discount_expiration_date)):
-            # Translator: xgettext:no-python-format
-            offer_message = _(u'{banner_open} Upgrade by {discount_expiration_date} and save {percentage}% '
-                              u'[{strikeout_price}]{span_close}{br}Discount will be automatically applied at checkout. '
-                              u'{a_open}Upgrade Now{a_close}{div_close}')
-            return Fragment(HTML(offer_message).format(
+            return Fragment(HTML(_OFFER_MESSAGE).format(
                 a_open=HTML(u'<a href="{upgrade_link}">').format(
                     upgrade_link=verified_upgrade_deadline_link(user=user, course=course)
                 ),
@@ -20,6 +20,7 @@ from course_modes.models import CourseMode
 from entitlements.models import CourseEntitlement
 from lms.djangoapps.experiments.stable_bucketing import stable_bucketing_hash_group
 from openedx.core.djangoapps.waffle_utils import WaffleFlag, WaffleFlagNamespace
+from openedx.core.lib.cache_utils import map_arg_to_id, request_cached
 from openedx.features.discounts.models import DiscountRestrictionConfig
 from student.models import CourseEnrollment
 from track import segment
@@ -43,21 +44,46 @@ DISCOUNT_APPLICABILITY_FLAG = WaffleFlag(
 
 DISCOUNT_APPLICABILITY_HOLDBACK = 'first_purchase_discount_holdback'
 
+# Modes from which a learner can upgrade to verified, as a set for checking loaded enrollments
+_UPSELL_MODES = frozenset(CourseMode.UPSELL_TO_VERIFIED_MODES)
 
+# The first purchase discount holdback ends at this time
+_HOLDBACK_END = datetime(2020, 8, 1, tzinfo=pytz.UTC)
+
+
+@request_cached(arg_map_function=map_arg_to_id)
+def discounts_enabled(user):
+    """
+    Returns whether discounting is enabled for the user, cached for the request.
+
+    This is the cheapest check of all and is false in the common case, so callers should
+    make it before doing any other work to compute discount applicability.
+    """
+    with impersonate(user):
+        return DISCOUNT_APPLICABILITY_FLAG.is_enabled()
+
+
+@request_cached(arg_map_function=map_arg_to_id)
 def get_discount_expiration_date(user, course):
     """
     Returns the date when the discount expires for the user.
     Returns none if the user is not enrolled.
     """
-    course_enrollment = CourseEnrollment.objects.filter(
-        user=user,
-        course=course.id,
-        mode__in=CourseMode.UPSELL_TO_VERIFIED_MODES
-    )
-    if len(course_enrollment) != 1:
+    enrollments, __ = _load_user_discount_context(user)
+    course_enrollments = [
+        enrollment for enrollment in enrollments
+        if enrollment.course_id == course.id and enrollment.mode in _UPSELL_MODES
+    ]
+    if len(course_enrollments) != 1:
         return None
 
-    enrollment = course_enrollment.first()
+    return _get_enrollment_discount_expiration_date(course_enrollments[0], course)
+
+
+def _get_enrollment_discount_expiration_date(enrollment, course):
+    """
+    Returns the date when the discount expires for the given upsellable enrollment in the course.
+    """
     try:
         # Content availability date is equivalent to max(enrollment date, course start date)
         # for most people. Using the schedule date will provide flexibility to deal with
@@ -77,15 +103,42 @@ def get_discount_expiration_date(user, course):
     return content_availability_date + timedelta(weeks=1)
 
 
+@request_cached(arg_map_function=map_arg_to_id)
+def _load_user_discount_context(user):
+    """
+    Returns a tuple of the user's enrollments (with their schedules) and whether the user has any entitlements.
+
+    Between them, these answer all of the questions about the user's enrollments and entitlements asked by
+    get_discount_expiration_date and can_receive_discount, which evaluate them in Python rather than querying
+    for each one.
+    """
+    enrollments = list(CourseEnrollment.objects.filter(user=user).select_related('schedule'))
+    has_entitlement = CourseEntitlement.objects.filter(user=user).exists()
+    return enrollments, has_entitlement
+
+
+@request_cached(namespace=CourseMode.CACHE_NAMESPACE, arg_map_function=map_arg_to_id)
+def _get_verified_mode(course):
+    """
+    Returns the course's non-expired verified mode, or None, cached for the request by course id.
+
+    The value is kept in the course modes request cache, so it is invalidated whenever a course mode is saved.
+    """
+    modes_dict = CourseMode.modes_for_course_dict(course=course, include_expired=False)
+    return modes_dict.get('verified', None)
+
+
+@request_cached(arg_map_function=map_arg_to_id)
 def can_receive_discount(user, course, discount_expiration_date=None):
     """
     Check all the business logic about whether this combination of user and course
     can receive a discount.
     """
     # Always disable discounts until we are ready to enable this feature
-    with impersonate(user):
-        if not DISCOUNT_APPLICABILITY_FLAG.is_enabled():
-            return False
+    if not discounts_enabled(user):
+        return False
+
+    now = timezone.now()
 
     # TODO: Add additional conditions to return False here
 
@@ -96,7 +149,7 @@ def can_receive_discount(user, course, discount_expiration_date=None):
     if discount_expiration_date is None:
         return False
 
-    if discount_expiration_date < timezone.now():
+    if discount_expiration_date < now:
         return False
 
     # Course end date needs to be in the future
@@ -104,8 +157,7 @@ def can_receive_discount(user, course, discount_expiration_date=None):
         return False
 
     # Course needs to have a non-expired verified mode
-    modes_dict = CourseMode.modes_for_course_dict(course=course, include_expired=False)
-    verified_mode = modes_dict.get('verified', None)
+    verified_mode = _get_verified_mode(course)
     if not verified_mode:
         return False
 
@@ -116,13 +168,15 @@ def can_receive_discount(user, course, discount_expiration_date=None):
     if user.is_anonymous:
         return False
 
+    enrollments, has_entitlement = _load_user_discount_context(user)
+
     # Don't allow users who have enrolled in any courses in non-upsellable
     # modes
-    if CourseEnrollment.objects.filter(user=user).exclude(mode__in=CourseMode.UPSELL_TO_VERIFIED_MODES).exists():
+    if any(enrollment.mode not in _UPSELL_MODES for enrollment in enrollments):
         return False
 
     # Don't allow any users who have entitlements (past or present)
-    if CourseEntitlement.objects.filter(user=user).exists():
+    if has_entitlement:
         return False
 
     # We can't import this at Django load time within the openedx tests settings context
@@ -132,17 +186,21 @@ def can_receive_discount(user, course, discount_expiration_date=None):
         return False
 
     # Excute holdback
-    if _is_in_holdback(user):
+    if _is_in_holdback(user, now=now):
         return False
 
     return True
 
 
-def _is_in_holdback(user):
+def _is_in_holdback(user, now=None):
     """
     Return whether the specified user is in the first-purchase-discount holdback group.
+
+    The holdback is checked as of ``now`` if given, or the current time otherwise.
     """
-    if datetime(2020, 8, 1, tzinfo=pytz.UTC) <= datetime.now(tz=pytz.UTC):
+    if now is None:
+        now = datetime.now(tz=pytz.UTC)
+    if _HOLDBACK_END <= now:
         return False
 
     # Holdback is 50/50
@@ -9,6 +9,7 @@ import ddt
 import pytz
 from django.contrib.sites.models import Site
 from django.utils.timezone import now
+from edx_django_utils.cache import RequestCache
 from mock import Mock, patch
 
 from course_modes.models import CourseMode
@@ -43,6 +44,9 @@ class TestApplicability(ModuleStoreTestCase):
         self.mock_holdback = holdback_patcher.start()
         self.addCleanup(holdback_patcher.stop)
 
+        # can_receive_discount is cached for the duration of the request
+        RequestCache.clear_all_namespaces()
+
     def test_can_receive_discount(self):
         # Right now, no one should be able to receive the discount
         applicability = can_receive_discount(user=self.user, course=self.course)
@@ -77,6 +81,24 @@ class TestApplicability(ModuleStoreTestCase):
         applicability = can_receive_discount(user=self.user, course=disabled_course)
         self.assertEqual(applicability, False)
 
+    @override_waffle_flag(DISCOUNT_APPLICABILITY_FLAG, active=True)
+    def test_can_receive_discount_request_cached(self):
+        """
+        Ensure that repeated checks for the same user and course within a request don't query again.
+        """
+        CourseEnrollmentFactory(
+            is_active=True,
+            course_id=self.course.id,
+            user=self.user
+        )
+
+        applicability = can_receive_discount(user=self.user, course=self.course)
+        self.assertEqual(applicability, True)
+
+        with self.assertNumQueries(0):
+            applicability = can_receive_discount(user=self.user, course=self.course)
+        self.assertEqual(applicability, True)
+
     @ddt.data(*(
         [[]] +
         [[mode] for mode in CourseMode.ALL_MODES] +